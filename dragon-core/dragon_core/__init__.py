@@ -10,3 +10,5 @@ APISCHEMAS = DRAGONDIR.joinpath("api/schemas")  # This should be a configuration
 MODULESDIR = DRAGONDIR.joinpath("modules")  # This should be a configuration option
 
 TEMPLATESDIR = DRAGONDIR.joinpath("../templates")  # This should be a configuration option
+
+JINJACACHEDIR = Path(os.path.expanduser("~/.cache/dragon_core/jinja"))  # This should be a configuration option
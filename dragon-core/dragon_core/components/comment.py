@@ -41,14 +41,14 @@ class SupportedCommentType(Enum):
                 return SupportedCommentType.string.value
 
             item = Path(item)
-        ext = item.suffix
-        try:
-            return cls[ext[1:]].value
-        except KeyError as e:
-            # if there is a KeyError it means it cannot find the extension, so the comment is not treated as a file.
-            pass
-
-        return SupportedCommentType.string.value
+        # If the extension is not supported, the comment is not treated as a file.
+        return _EXTENSION_TYPES.get(item.suffix.lower(), SupportedCommentType.string.value)
+
+
+# Maps the file extensions that can be comments to the value of their comment type.
+_EXTENSION_TYPES = {".md": SupportedCommentType.md.value,
+                    ".jpg": SupportedCommentType.jpg.value,
+                    ".png": SupportedCommentType.png.value}
 
 
 class Comment:
@@ -6,20 +6,64 @@ The 2 things that it needs to implement is the template attribute, which is the
 path to the jinja template that it needs to render and the parser function.
 The parser function goes through that entity TOML data file and parses the information there to a dictionary to
 render the template with.`
+The renderers listed in AvailableRenderers get their template compiled once, when this module is imported
+(check compile_templates).
 """
 import os
 import json
+import uuid
 import shutil
 from enum import Enum
-from typing import Union, Tuple, List, Optional
+from functools import lru_cache, partial
+from typing import Union, Tuple, List, Optional, Iterable
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 import tomllib as toml
-from jinja2 import Environment, FileSystemLoader
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache, Template
 
-from dragon_core import TEMPLATESDIR
+from dragon_core import TEMPLATESDIR, JINJACACHEDIR
 from dragon_core.components.comment import SupportedCommentType, Comment
 
+# Comment types that get rendered as images.
+_IMAGE_TYPES = frozenset({SupportedCommentType.jpg, SupportedCommentType.png})
+
+
+class _BytecodeCache(FileSystemBytecodeCache):
+    """
+    Bytecode cache that never fails a render. If a compiled template cannot be written to disk, it just does not get
+    cached and the template gets compiled again by the next process.
+    """
+
+    def dump_bytecode(self, bucket) -> None:
+        try:
+            super().dump_bytecode(bucket)
+        except OSError:
+            pass
+
+
+def _create_bytecode_cache() -> Optional[FileSystemBytecodeCache]:
+    """
+    Creates the on disk cache for compiled templates, so that new processes don't have to compile them again.
+    The cache files are keyed by the source of the template, so editing a template invalidates them.
+
+    :return: The bytecode cache, or None if the cache directory cannot be created or written to.
+    """
+    try:
+        os.makedirs(JINJACACHEDIR, exist_ok=True)
+    except OSError:
+        return None
+    if not os.access(JINJACACHEDIR, os.W_OK):
+        return None
+    return _BytecodeCache(directory=str(JINJACACHEDIR), pattern="__jinja2_%s.cache")
+
+
+_BCC = _create_bytecode_cache()
+
+# Shared jinja environment. Compiled templates are cached on it by name, so every render after the first one for a
+# given template skips the parsing and compiling.
+_ENV = Environment(loader=FileSystemLoader(TEMPLATESDIR), auto_reload=False, bytecode_cache=_BCC)
+
 
 def get_all_files(path: Union[Path, str]) -> list[Path]:
     """
@@ -29,75 +73,211 @@ def get_all_files(path: Union[Path, str]) -> list[Path]:
     :return: List with all the files inside it.
     """
     file_list = []
-    path = Path(path)
-
-    # Iterate over all items in the directory
-    for item in path.iterdir():
-        if item.is_file():
-            file_list.append(item.absolute())
-        elif item.is_dir():
-            file_list.extend(get_all_files(item))
+    # Walking the tree with a stack instead of recursion. The entries from scandir already know their type from the
+    # directory read, so checking them does not cost an extra stat.
+    stack = [os.path.abspath(path)]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    file_list.append(Path(entry.path))
+                elif entry.is_dir():
+                    stack.append(entry.path)
 
     return file_list
 
 
+@lru_cache(maxsize=1024)
+def _read_markdown_cached(path: str, mtime_ns: int, size: int) -> str:
+    """
+    Reads the markdown file. The modification time and size are only there to be part of the cache key.
+    """
+    return Path(path).read_text(encoding='utf-8')
+
+
+def read_markdown(path: Union[Path, str]) -> str:
+    """
+    Gets the content of a markdown file. The same markdown file can be a comment in many entities, so the content is
+    cached and only read from disk again if the file has been modified since the last read.
+
+    :param path: The path to the markdown file.
+    :return: The content of the markdown file.
+    """
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    return _read_markdown_cached(path, st.st_mtime_ns, st.st_size)
+
+
+@lru_cache(maxsize=1024)
+def _load_toml_cached(path: str, mtime_ns: int, size: int) -> dict:
+    """
+    Parses the TOML file. The modification time and size are only there to be part of the cache key.
+    """
+    with open(path, 'rb') as f:
+        return toml.load(f)
+
+
+def load_toml(path: Union[Path, str]) -> dict:
+    """
+    Parses a TOML file. Generating a notebook reads the same TOML files multiple times, so the parsed data is cached
+    and the file only gets parsed again if it has been modified since the last parse.
+    The returned dictionary is shared between calls, so it should not be modified.
+
+    :param path: The path to the TOML file.
+    :return: The parsed TOML file.
+    """
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    return _load_toml_cached(path, st.st_mtime_ns, st.st_size)
+
+
+@lru_cache(maxsize=4096)
+def parse_comment(com: str) -> Comment:
+    """
+    Reconstructs a Comment from its JSON representation in an entity TOML file.
+    Checking if an md is up to date and rendering it both go through the comments of the entity, so the parsed comments
+    are cached. The returned comment is shared between calls, so it should not be modified.
+
+    :param com: The JSON representation of the comment.
+    :return: The comment.
+    """
+    # Parse the JSON representation of the comment into a dictionary and pass those as kwargs to a Comment constructor
+    return Comment(**json.loads(com))
+
+
+def copy_image(source: Union[Path, str], target: Union[Path, str]) -> None:
+    """
+    Copies an image to the target path. The same image can be a comment in many entities, so the copy is skipped if
+    the target is already a copy of the current version of the image.
+
+    :param source: The path to the image.
+    :param target: The path the image gets copied to.
+    """
+    source_stat = os.stat(source)
+    try:
+        target_stat = os.stat(target)
+        # copy2 keeps the modification time, so an unchanged image has the same size and modification time as its copy.
+        if target_stat.st_size == source_stat.st_size and target_stat.st_mtime_ns == source_stat.st_mtime_ns:
+            return
+    except FileNotFoundError:
+        pass
+    shutil.copy2(source, target)
+
+
 class EntityRenderer:
 
     # All renderers have to specify the path to the template they use for rendering.
     template = TEMPLATESDIR.joinpath("md_entity.jinja")
 
+    # Compiled version of the template. Set when the module is imported for every renderer in AvailableRenderers.
+    compiled_template: Optional[Template] = None
+
     # If this is not None, image files will be copied to the image_path in a f
     image_path: Optional[Path] = None
 
     @classmethod
-    def format_comment(cls, comment: Comment) -> Tuple[Union[str, List[str]], Union[str, List[str]]]:
+    def comment_files(cls, content: Union[str, Path], com_type: SupportedCommentType) \
+            -> Tuple[Optional[Path], Optional[Path]]:
+        """
+        Gets the file a comment is rendered from and, if rendering copies it somewhere, the path of the copy.
+        Both rendering the comment and checking if the md needs to be rendered again use this.
+
+        :param content: The content of the comment.
+        :param com_type: The type of the comment.
+        :return: The path to the file of the comment, None if the comment is not a file. And the path the file gets
+            copied to when rendering, None if the file does not get copied.
+        """
+        if com_type == SupportedCommentType.md:
+            return Path(content), None
+
+        # If rendering to the notebook, images get copied to the images folder.
+        if com_type in _IMAGE_TYPES:
+            pic_path = Path(content)
+            if cls.image_path is None:
+                return pic_path, None
+            return pic_path, cls.image_path.joinpath(pic_path.name)
+
+        return None, None
+
+    @classmethod
+    def format_comment(cls, comment: Comment) -> Tuple[str, str]:
         """
         Checks the type of comment, and formats the string value for it accordingly.
         If the comment is a markdown file, get the text from the file, and it will render a section with the file name
         and the content under it. If the comment is an image, it will display a tittle with the file name and the image
-        under it. If the comment is a directory, it will recursively go through all the files inside it and format them.
+        under it. If the comment is a table, it will render the table in markdown.
+        Directories never reach this point, since adding a directory to an entity adds a comment for every file in it.
 
-        :param comment: The comment to be formatted. Either a Path to a file or a string.
-        :return: If comment is a file or string, returns the key and value for the comment. If comment is a directory,
-            returns a list of keys and values for all the files inside it.
+        :param comment: The comment to be formatted.
+        :return: The key and value for the comment.
         """
 
         key, val = None, None
         content, com_type, user, date = comment.last_comment()
+        com_type = SupportedCommentType(com_type)
+        source, copy = cls.comment_files(content, com_type)
 
         # For markdown bring the value of the md as string directly.
-        if SupportedCommentType(com_type) == SupportedCommentType.md:
-            md_path = Path(content)
-            with open(md_path, 'r') as f:
-                md = f.read()
-                key = md_path.stem
-                val = md
+        if com_type == SupportedCommentType.md:
+            key = source.stem
+            val = read_markdown(source)
 
         # For string, key and val are equal
-        elif SupportedCommentType(com_type) == SupportedCommentType.string:
+        elif com_type == SupportedCommentType.string:
             key = content
             val = content
 
         # For any image type, we want to format the string for md to load the image.
-        elif SupportedCommentType(com_type) == SupportedCommentType.jpg or SupportedCommentType(com_type) == SupportedCommentType.png:
-            pic_path = Path(content)
-            name = pic_path.stem.replace("_", " ")
-            if cls.image_path is None:
-                key = pic_path.stem
-                val = f"![{name}]({pic_path.absolute()})"
+        elif com_type in _IMAGE_TYPES:
+            name = source.stem.replace("_", " ")
+            key = source.stem
+            if copy is None:
+                val = f"![{name}]({os.path.abspath(source)})"
             # If rendering to the notebook, the path is to the images folder.
             else:
-                target_path = cls.image_path.joinpath(pic_path.name)
-                shutil.copy(pic_path, target_path)
-                key = pic_path.stem
-                val = f"![{name}](/images/{pic_path.name})"
+                copy_image(source, copy)
+                val = f"![{name}](/images/{copy.name})"
 
-        elif SupportedCommentType(com_type) == SupportedCommentType.table:
+        elif com_type == SupportedCommentType.table:
             key = ""
             val = content.to_markdown()
 
         return key, val
 
+    @classmethod
+    def dependencies(cls, data: dict) -> List[Path]:
+        """
+        Gets all the files that the md of the entity is rendered from, other than the TOML file itself.
+        These are the templates and the files of the comments (check comment_files). If rendering copies the files
+        somewhere, the copies are also included.
+
+        :param data: The data of the entity TOML file.
+        :return: List with the paths of all the files.
+        """
+        # Every template extends the entity template.
+        ret = [EntityRenderer.template, cls.template]
+        for com in data['comments']:
+            content, com_type, user, date = parse_comment(com).last_comment()
+            ret.extend(path for path in cls.comment_files(content, SupportedCommentType(com_type)) if path is not None)
+        return ret
+
+    @classmethod
+    def format_link(cls, path: Union[Path, str]) -> str:
+        """
+        Formats a link to the md of another entity.
+
+        :param path: The path to the TOML file of the other entity.
+        :return: The markdown link, pointing to an absolute path or, when rendering for a jupyterbook, to the md in
+            the same directory.
+        """
+        # We replace the spaces in the name with underscores to make links work properly in a jupyterbook.
+        data_path = Path(str(path).replace(" ", "_"))
+        # But we don't want underscore in the pages themselves, so we replace them back to spaces.
+        name = data_path.stem.replace("_", " ")
+        if cls.image_path is None:
+            return f"[{name}]({os.path.abspath(data_path.with_suffix('.md'))})"
+        return f"[{name}](./{data_path.with_suffix('.md').name})"
+
     # FIXME: Make sure you correct the docstring since this thing does not read the TOML file anymore
     @classmethod
     def parser(cls, data: dict) -> dict:
@@ -107,50 +287,16 @@ class EntityRenderer:
         :param path: The path for the TOML source.
         :return: The dictionary with the keys and vals that the jinja template needs.
         """
-        # Basic fields
         ret = {"name": data['name'].replace("_", " "),
                "type": data['type'],
                "ID": data['ID'],
                "user": data['user'],
-               "description": data['description']}
-
-        # Fields with more complicated formatting
-        if data['parent'] == '':
-            ret["parent"] = None
-        else:
-            # We replace the spaces in the parent name with underscores to make links work properly in a jupyterbook.
-            data_path = Path(data['parent'].replace(" ", "_"))
-            # But we don't want underscore in the pages themselves, so we replace them back to spaces.
-            name = data_path.stem.replace("_", " ")
-            if cls.image_path is None:
-                ret["parent"] = f"[{name}]({data_path.with_suffix('.md').absolute()})"
-            else:
-                ret["parent"] = f"[{name}](./{data_path.with_suffix('.md').name})"
-
-        comments = {}
-        for com in data['comments']:
-            # Parse the JSON representation of the comment into a dictionary and pass those as kwargs to a Comment constructor
-            parsed_com = Comment(**json.loads(com))
-            key, val = cls.format_comment(parsed_com)
-            # If the comment is a directory, format_comment will return a list of keys and values.
-            if isinstance(key, list):
-                for k, v in zip(key, val):
-                    comments[k] = v
-            else:
-                comments[key] = val
-        ret["comments"] = comments
-
-        children = ""
-        for child in data['children']:
-            child_path = Path(child.replace(" ", "_"))
-            if child_path.suffix == '.toml':
-                name = child_path.stem.replace("_", " ")
-                if cls.image_path is None:
-                    children = children + f"[{name}]({child_path.with_suffix('.md').absolute()}), "
-                else:
-                    children = children + f"[{name}](./{child_path.with_suffix('.md').name}), "
+               "description": data['description'],
+               "parent": cls.format_link(data['parent']) if data['parent'] != '' else None,
+               "children": "".join(cls.format_link(child) + ", " for child in data['children']
+                                   if Path(child).suffix == '.toml')}
 
-        ret["children"] = children
+        ret["comments"] = dict(cls.format_comment(parse_comment(com)) for com in data['comments'])
 
         return ret
 
@@ -206,10 +352,54 @@ class AvailableRenderers(Enum):
     Step = StepRenderer
 
 
+# Plain dictionary version of AvailableRenderers, to look up the renderer of a type by name.
+_RENDERERS = {renderer.name: renderer.value for renderer in AvailableRenderers}
+
+
+def compile_templates() -> None:
+    """
+    Compiles the templates of all the renderers. This happens once when the module is imported, so that rendering only
+    has to execute them. Template files are not checked for changes after that, so this needs to be called again
+    for changes in a template file to show up in the rendered markdown files.
+    """
+    _ENV.cache.clear()
+    for renderer in _RENDERERS.values():
+        renderer.compiled_template = _ENV.get_template(renderer.template.name)
+
+
+compile_templates()
+
+
+def is_up_to_date(target: Union[Path, str], dependencies: Iterable[Union[Path, str]]) -> bool:
+    """
+    Checks if the target file was modified after all of its dependencies.
+
+    :param target: The path to the file generated from the dependencies.
+    :param dependencies: The paths to the files the target is generated from.
+    :return: True if the target and all the dependencies exist and the target is newer than all of them.
+    """
+    try:
+        target_mtime = os.stat(target).st_mtime_ns
+        return all(os.stat(dep).st_mtime_ns < target_mtime for dep in dependencies)
+    except FileNotFoundError:
+        return False
+
+
+def md_name(source: Union[Path, str]) -> str:
+    """
+    Gets the name of the markdown file generated from a TOML file.
+
+    :param source: The path to the TOML file.
+    :return: The name of the markdown file.
+    """
+    return Path(source).stem.replace(" ", "_") + ".md"
+
+
 # TODO: Make sure you move the pictures to the resource folder. We can make it such that we read it from source,
 def generate_md(source: Union[Path, str],
                 target: Optional[Union[Path, str]] = None,
                 images_path: Optional[Union[Path, str]] = None,
+                skip_up_to_date: bool = False,
                 ) -> Path:
 
     """
@@ -221,6 +411,12 @@ def generate_md(source: Union[Path, str],
         This is used when creating a md for a jupyterbook where all the resources should be located at a central
         resource folder, with all the comment
     links relative to the resource folder, even if the md is located somewhere else.
+    :param skip_up_to_date: If True, the markdown file is not rendered again if it is newer than the TOML file and
+        all the other files it depends on (check EntityRenderer.dependencies). Only use it if the existing markdown
+        file was rendered with the same images_path, since that changes the output but not the dependencies.
+        Changes in a template file are only used after calling compile_templates. A markdown file rendered with the old
+        compiled template after the template file was modified is newer than it and counts as up to date, so call
+        compile_templates before rendering again after modifying a template.
     :return: The path to the generated markdown file.
 
     """
@@ -228,31 +424,70 @@ def generate_md(source: Union[Path, str],
     source = Path(source)
     if target is None:
         target = os.getcwd()
-    target = Path(str(target).replace(" ", "_")).joinpath(source.stem.replace(" ", "_") + ".md")
+    target = Path(str(target).replace(" ", "_")) / md_name(source)
 
     if images_path is not None:
         images_path = Path(images_path)
 
-    with open(source, 'rb') as f:
-        data = toml.load(f)
-
-    data = data[next(iter(data))]
+    data = next(iter(load_toml(source).values()))
 
-    env = Environment(loader=FileSystemLoader(TEMPLATESDIR))
-
-    if not hasattr(AvailableRenderers, data['type']):
+    try:
+        renderer = _RENDERERS[data['type']]
+    except KeyError:
         raise ValueError(f"Type {data['type']} Does not have a renderer.")
-    renderer = getattr(AvailableRenderers, data['type']).value
     renderer.image_path = images_path
-    template = env.get_template(renderer.template.name)
+
+    if skip_up_to_date and is_up_to_date(target, [source, *renderer.dependencies(data)]):
+        return target
 
     vals_dict = renderer.parser(data)
-    output = template.render(vals_dict)
+    output = renderer.compiled_template.render(vals_dict)
+
+    # Writing to a temporary file first and swapping it in, so that an interrupted render never leaves a partial md.
+    # The temporary file gets a unique name, so that writers rendering to the same target don't collide.
+    # It is created with the same permissions as any other new file, so the umask of the process applies.
+    tmp_target = target.parent / f".{target.name}.{uuid.uuid4().hex}.tmp"
+    fd = os.open(tmp_target, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0), 0o666)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(output.encode('utf-8'))
+        os.replace(tmp_target, target)
+    except BaseException:
+        if os.path.exists(tmp_target):
+            os.unlink(tmp_target)
+        raise
 
-    if not target.exists():
-        target.touch()
+    return target
 
-    with open(target, 'w') as f:
-        f.write(output)
 
-    return target
+def generate_md_batch(sources: Iterable[Union[Path, str]],
+                      target: Optional[Union[Path, str]] = None,
+                      images_path: Optional[Union[Path, str]] = None,
+                      max_workers: Optional[int] = None,
+                      skip_up_to_date: bool = False,
+                      ) -> List[Path]:
+    """
+    Generates a markdown file for each of the TOML files in sources. The files get generated in parallel in a pool of
+    processes, so no two sources can generate a markdown file with the same name.
+    Check generate_md for the details of each file.
+
+    :param sources: The TOML files to generate the markdown files from.
+    :param target: Directory where the markdown files will be saved.
+    :param images_path: Directory where the resources for the markdown files will be saved.
+    :param max_workers: Maximum number of processes to use. Defaults to the number of processors in the machine.
+    :param skip_up_to_date: If True, markdown files that are newer than everything they depend on are not rendered
+        again.
+    :return: The paths to the generated markdown files, in the same order as sources.
+    :raises ValueError: If multiple sources would generate a markdown file with the same name.
+    """
+    sources = list(sources)
+    names = {}
+    for source in sources:
+        name = md_name(source)
+        if name in names:
+            raise ValueError(f"{names[name]} and {source} would both generate {name}.")
+        names[name] = source
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        render = partial(generate_md, target=target, images_path=images_path, skip_up_to_date=skip_up_to_date)
+        return list(executor.map(render, sources))
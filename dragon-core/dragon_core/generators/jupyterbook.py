@@ -9,7 +9,7 @@ import tomllib as toml
 from jinja2 import Environment, FileSystemLoader
 
 from dragon_core import DRAGONDIR, TEMPLATESDIR
-from dragon_core.generators.display import generate_md
+from dragon_core.generators.display import generate_md, load_toml
 
 
 # FIXME: Right now we are generating the md files twice, we should figure out a way of doing it only once.
@@ -31,8 +31,7 @@ def _generate_children_dict(root_path: Path, target: Path, indent: int, resource
 
     """
 
-    with open(root_path, 'rb') as f:
-        data = toml.load(f)
+    data = load_toml(root_path)
 
     current_indent = indent+1
     data = data[next(iter(data))]
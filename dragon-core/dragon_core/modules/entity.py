@@ -184,11 +184,11 @@ class Entity(object):
         # Function inside function because its very specific to adding comments and should not be called from anywhere else
         def add_directory(path: Path) -> None:
             files = [file for file in path.iterdir() if file.is_file()]
-            supported_items = SupportedCommentType.__members__.keys()
             for file in sorted(files):
                 if file.is_dir():
                     continue
-                if file.suffix[1:] in supported_items:
+                # Files that are not supported get classified as strings.
+                if SupportedCommentType.classify(file) != SupportedCommentType.string.value:
                     self.add_comment(Comment(file, user))
                 else:
                     continue
@@ -107,6 +107,21 @@ def test_classificator(tmp_path):
     f_path.touch()
     assert SupportedCommentType.classify(text) == SupportedCommentType.png.value
 
+    # testing files with upper case extensions
+    text = "my_path/somefilename.PNG"
+    f_path = tmp_path.joinpath(text)
+    f_path.touch()
+    assert SupportedCommentType.classify(text) == SupportedCommentType.png.value
+
+    text = "my_path/somefilename.JPG"
+    f_path = tmp_path.joinpath(text)
+    f_path.touch()
+    assert SupportedCommentType.classify(text) == SupportedCommentType.jpg.value
+
+    # testing files with extensions that are not supported, including the names of non-file comment types
+    for text in ["my_path/somefilename.txt", "my_path/somefilename.string", "my_path/somefilename.table"]:
+        assert SupportedCommentType.classify(text) == SupportedCommentType.string.value
+
     # testing a long string
     text = "Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor incididunt ut labore et dolore magna aliqua. Ut enim ad minim veniam, quis nostrud exercitation ullamco laboris nisi ut aliquip ex ea commodo consequat. Duis aute irure dolor in reprehenderit in voluptate velit esse cillum dolore eu fugiat nulla pariatur. Excepteur sint occaecat cupidatat non proident, sunt in culpa qui officia deserunt mollit anim id est laborum."
     assert SupportedCommentType.classify(text) == SupportedCommentType.string.value
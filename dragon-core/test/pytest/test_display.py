@@ -0,0 +1,246 @@
+import os
+import json
+import shutil
+
+import pytest
+
+from dragon_core.components import Comment
+from dragon_core.generators import display
+from dragon_core.generators.display import generate_md, generate_md_batch
+
+user = 'test_user'
+
+
+def create_toml(path, name, entity_type="Entity", comments=None):
+    """
+    Writes a minimal entity TOML file. If no comments are passed, it has a single string comment.
+    """
+    if comments is None:
+        comments = [f"This is a comment of {name}"]
+    comments = ", ".join(json.dumps(str(Comment(str(com), user))) for com in comments)
+    lines = [f'["{name}"]',
+             f'ID = "{name}_ID"',
+             f'name = "{name}"',
+             f'type = "{entity_type}"',
+             f'user = "{user}"',
+             f'description = "This is the description of {name}"',
+             'parent = ""',
+             'children = []',
+             f'comments = [{comments}]']
+    toml_path = path.joinpath(f"{name}.toml")
+    toml_path.write_text("\n".join(lines))
+    return toml_path
+
+
+def test_batch_generation(tmp_path):
+    sources = [create_toml(tmp_path, "First Entity"), create_toml(tmp_path, "Second Entity")]
+    target = tmp_path.joinpath("md")
+    target.mkdir()
+
+    generated = generate_md_batch(sources, target, max_workers=2)
+
+    assert generated == [target.joinpath("First_Entity.md"), target.joinpath("Second_Entity.md")]
+    for md, name in zip(generated, ["First Entity", "Second Entity"]):
+        assert md.exists()
+        text = md.read_text()
+        assert f"# {name}" in text
+        assert f"This is a comment of {name}" in text
+
+    # Only the generated files should be there, no left over temporary files.
+    assert sorted(target.iterdir()) == generated
+
+
+def test_batch_generation_with_same_target_name(tmp_path):
+    first_dir = tmp_path.joinpath("first")
+    second_dir = tmp_path.joinpath("second")
+    first_dir.mkdir()
+    second_dir.mkdir()
+    sources = [create_toml(first_dir, "Same Entity"), create_toml(second_dir, "Same Entity")]
+
+    with pytest.raises(ValueError):
+        generate_md_batch(sources, tmp_path)
+
+
+def test_md_permissions_follow_umask(tmp_path):
+    source = create_toml(tmp_path, "Permissions Entity")
+
+    old_umask = os.umask(0o027)
+    try:
+        md = generate_md(source, tmp_path)
+    finally:
+        os.umask(old_umask)
+
+    assert md.stat().st_mode & 0o777 == 0o640
+    # Only the TOML and the md should be there, no left over temporary files.
+    assert sorted(x.name for x in tmp_path.iterdir()) == ["Permissions Entity.toml", "Permissions_Entity.md"]
+
+
+def render_with_bytecode_cache(monkeypatch, tmp_path, bytecode_cache):
+    """
+    Compiles the templates with the passed bytecode cache and renders an entity with them.
+    """
+    monkeypatch.setattr(display._ENV, "bytecode_cache", bytecode_cache)
+    display.compile_templates()
+
+    source = create_toml(tmp_path, "Cached Entity")
+    md = generate_md(source, tmp_path)
+    assert "# Cached Entity" in md.read_text()
+
+
+def test_read_only_bytecode_cache(monkeypatch, tmp_path):
+    cache_dir = tmp_path.joinpath("cache")
+    cache_dir.mkdir()
+    cache_dir.chmod(0o555)
+    monkeypatch.setattr(display, "JINJACACHEDIR", cache_dir)
+
+    try:
+        render_with_bytecode_cache(monkeypatch, tmp_path, display._create_bytecode_cache())
+    finally:
+        cache_dir.chmod(0o755)
+
+
+def test_bytecode_cache_that_cannot_be_written(monkeypatch, tmp_path):
+    # The directory is gone by the time the templates get compiled, so writing the compiled templates fails.
+    cache_dir = tmp_path.joinpath("cache")
+    cache_dir.mkdir()
+    monkeypatch.setattr(display, "JINJACACHEDIR", cache_dir)
+    bytecode_cache = display._create_bytecode_cache()
+    assert bytecode_cache is not None
+    cache_dir.rmdir()
+
+    render_with_bytecode_cache(monkeypatch, tmp_path, bytecode_cache)
+
+
+def create_entity_with_files(tmp_path):
+    """
+    Creates an entity with a markdown and an image comment, and the directory for its md.
+    """
+    md_comment = tmp_path.joinpath("notes.md")
+    md_comment.write_text("These are the notes")
+    image = tmp_path.joinpath("koala_picture.png")
+    image.write_bytes(b"not really a png")
+    source = create_toml(tmp_path, "Entity With Files", comments=["A comment", md_comment, image])
+    target = tmp_path.joinpath("md")
+    target.mkdir()
+    return source, md_comment, image, target
+
+
+def make_newer(path, reference):
+    """
+    Sets the modification time of path to be one second after the one of reference.
+    """
+    mtime = os.stat(reference).st_mtime_ns + 1_000_000_000
+    os.utime(path, ns=(mtime, mtime))
+
+
+def file_version(path):
+    """
+    Rendering replaces the md with a new file, so a render changes the inode even if the modification time is the same.
+    """
+    st = os.stat(path)
+    return st.st_ino, st.st_mtime_ns
+
+
+def test_skip_up_to_date(tmp_path):
+    source, md_comment, image, target = create_entity_with_files(tmp_path)
+
+    md = generate_md(source, target, skip_up_to_date=True)
+    assert "These are the notes" in md.read_text()
+    mtime = md.stat().st_mtime_ns
+
+    version = file_version(md)
+
+    assert generate_md(source, target, skip_up_to_date=True) == md
+    assert md.stat().st_mtime_ns == mtime
+    assert file_version(md) == version
+
+
+@pytest.mark.parametrize("modified", ["source", "md_comment", "image"])
+def test_modified_dependency_renders_again(tmp_path, modified):
+    source, md_comment, image, target = create_entity_with_files(tmp_path)
+    md = generate_md(source, target, skip_up_to_date=True)
+    version = file_version(md)
+
+    if modified == "md_comment":
+        md_comment.write_text("These are the new notes")
+    make_newer({"source": source, "md_comment": md_comment, "image": image}[modified], md)
+
+    generate_md(source, target, skip_up_to_date=True)
+    assert file_version(md) != version
+    if modified == "md_comment":
+        assert "These are the new notes" in md.read_text()
+
+
+def test_deleted_image_copy_renders_again(tmp_path):
+    source, md_comment, image, target = create_entity_with_files(tmp_path)
+    images_path = tmp_path.joinpath("images")
+    images_path.mkdir()
+    copy = images_path.joinpath(image.name)
+
+    md = generate_md(source, target, images_path, skip_up_to_date=True)
+    version = file_version(md)
+    assert copy.exists()
+
+    copy.unlink()
+    generate_md(source, target, images_path, skip_up_to_date=True)
+    assert file_version(md) != version
+    assert copy.read_bytes() == image.read_bytes()
+
+
+def test_skip_up_to_date_with_missing_md(tmp_path):
+    source, md_comment, image, target = create_entity_with_files(tmp_path)
+
+    md = generate_md(source, target, skip_up_to_date=True)
+    assert md.exists()
+    assert "# Entity With Files" in md.read_text()
+
+
+def count_copies(monkeypatch):
+    """
+    Counts the times images get copied when rendering.
+    """
+    copies = []
+    original_copy2 = shutil.copy2
+
+    def copy2(src, dst):
+        copies.append(dst)
+        return original_copy2(src, dst)
+
+    monkeypatch.setattr(display.shutil, "copy2", copy2)
+    return copies
+
+
+def test_unchanged_image_is_not_copied_again(monkeypatch, tmp_path):
+    source, md_comment, image, target = create_entity_with_files(tmp_path)
+    images_path = tmp_path.joinpath("images")
+    images_path.mkdir()
+    copy = images_path.joinpath(image.name)
+    copies = count_copies(monkeypatch)
+
+    generate_md(source, target, images_path)
+    assert copies == [copy]
+    assert copy.stat().st_mtime_ns == image.stat().st_mtime_ns
+    mtime = copy.stat().st_mtime_ns
+
+    generate_md(source, target, images_path)
+    assert copies == [copy]
+    assert copy.stat().st_mtime_ns == mtime
+
+
+def test_modified_image_is_copied_again(monkeypatch, tmp_path):
+    source, md_comment, image, target = create_entity_with_files(tmp_path)
+    images_path = tmp_path.joinpath("images")
+    images_path.mkdir()
+    copy = images_path.joinpath(image.name)
+    copies = count_copies(monkeypatch)
+
+    generate_md(source, target, images_path)
+
+    # Same size as the original, so only the modification time tells them apart.
+    image.write_bytes(b"not really a PNG")
+    make_newer(image, copy)
+    generate_md(source, target, images_path)
+
+    assert copies == [copy, copy]
+    assert copy.read_bytes() == b"not really a PNG"
+    assert copy.stat().st_mtime_ns == image.stat().st_mtime_ns